@@ -1,11 +1,21 @@
-import csv
 import re
-import random
-import string
 import argparse
+import hashlib
 import os
 import sys
-import pandas as pd
+
+# Strips everything but letters from a name before taking its code prefix
+_NONALPHA_RE = re.compile(r'[^A-Za-z]')
+
+# Only the item number, description and quantity columns (A:C) are read from a sheet, as raw
+# cell values; a callable rather than [0, 1, 2] so sheets with fewer columns still load
+READ_OPTIONS = {"usecols": lambda column: column < 3, "header": None, "dtype": object}
+
+# Parsed sheets are cached here between runs (see _cached_read); bump CACHE_VERSION
+# whenever READ_OPTIONS changes so sheets parsed the old way are not reused.
+# Deleting the directory clears the cache.
+CACHE_VERSION = 3
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "stockformatter")
 
 class FormatDocument:
     header = [
@@ -21,140 +31,247 @@ class FormatDocument:
         "description",
     ]
 
-    def __init__(self, excel_path, sheet_name=0):
+    # Common brand keywords
+    brand_keywords = ("LINSAN", "BREVILLE", "PRIMA", "TESCO", "COLEMAN", "SAINSBURY'S",
+                      "PYREX", "PHILIPS", "ELPINE", "OZARK", "SNAPWARE", "RUBBERMAID",
+                      "CORNINGWARE", "KIRKLAND", "HAIER", "INDESIT", "MIKASA", "LUMINARC")
+    colors = ("RED", "BLUE", "GREEN", "BLACK", "WHITE", "GREY", "PINK", "SILVER", "NAVY")
+
+    def __init__(self, excel_or_path, sheet_name=0, use_cache=True, branch="ojodu", branch_id="3"):
         """
-        Initialize with the path to an Excel file.
+        Initialize with the path to an Excel file, a file-like object holding one, or an
+        already open pd.ExcelFile (e.g. from open_excel) so a workbook that was inspected
+        is not parsed again.
         sheet_name can be the name of a specific sheet or an index (default is 0 for first sheet)
+        use_cache reuses the sheet parsed on a previous run while the file is unchanged
+        (only for paths; file-like objects are always parsed)
+        branch and branch_id are assigned to every item
         """
-        self.excel_path = excel_path
+        # pandas is imported where it is needed so --help and --list-sheets start quickly
+        import pandas as pd
+        
+        if isinstance(excel_or_path, pd.ExcelFile):
+            self.excel_path = None
+            self._xl = excel_or_path
+        else:
+            self.excel_path = excel_or_path
+            self._xl = None
         self.sheet_name = sheet_name
-        self.items = []
+        self.use_cache = use_cache
+        self.branch = branch
+        self.branch_id = branch_id
+        self.df = pd.DataFrame(columns=self.header)
         self.parse_excel()
 
+    @property
+    def items(self):
+        """Items as a list of dicts, one per row"""
+        return self.df.to_dict("records")
+
     def parse_excel(self):
         """Parse the Excel file and extract item data"""
+        import numpy as np
+        import pandas as pd
+        
         try:
-            # Read the Excel file
-            df = pd.read_excel(self.excel_path, sheet_name=self.sheet_name)
+            # Read the sheet from the open workbook, or from the file (via the cache for paths)
+            if self._xl is not None:
+                df = self._xl.parse(self.sheet_name, **READ_OPTIONS)
+            elif self.use_cache and isinstance(self.excel_path, (str, os.PathLike)):
+                df = _cached_read(self.excel_path, self.sheet_name)
+            else:
+                with open_excel(self.excel_path) as xl:
+                    df = xl.parse(self.sheet_name, **READ_OPTIONS)
             
-            # Find the row index where the actual data starts (after headers)
-            start_row = 0
-            for i, col_value in enumerate(df.iloc[:, 1]):  # Check the second column which should have "ITEM DESCRIPTION"
-                if isinstance(col_value, str) and "ITEM DESCRIPTION" in col_value:
-                    start_row = i + 1
-                    break
+            # Find the row index where the actual data starts (after headers), checking the
+            # whole second column, which should have "ITEM DESCRIPTION", in one pass
+            is_header = df.iloc[:, 1].astype(str).str.contains("ITEM DESCRIPTION", na=False, regex=False)
+            start_row = int(is_header.idxmax()) + 1 if is_header.any() else 0
             
-            # Extract the data rows
-            data_df = df.iloc[start_row:].reset_index(drop=True)
+            # Extract the data rows (item number, description and quantity columns)
+            data = df.iloc[start_row:]
+            ids = pd.to_numeric(data.iloc[:, 0], errors="coerce")
+            # Strip names so they come out the same whichever engine read the sheet
+            # (calamine trims trailing whitespace in cells, openpyxl keeps it)
+            names = data.iloc[:, 1].astype(str).str.strip()
+            # Which cells are filled in, evaluated for all three columns at once
+            present = data.notna()
             
-            # Process each row
-            for idx, row in data_df.iterrows():
-                try:
-                    # Skip rows without an item number in the first column
-                    if not isinstance(row.iloc[0], (int, float)) or pd.isna(row.iloc[0]):
-                        continue
-                    
-                    # Extract data from the row
-                    item_id = str(int(row.iloc[0]))  # Convert to int first to remove decimal points
-                    item_name = str(row.iloc[1]) if not pd.isna(row.iloc[1]) else ""
-                    
-                    # Skip empty item names
-                    if not item_name.strip():
-                        continue
-                    
-                    # Extract quantity if available (column index 2)
-                    quantity = "1"  # Default
-                    if len(row) > 2 and not pd.isna(row.iloc[2]) and str(row.iloc[2]).isdigit():
-                        quantity = str(int(row.iloc[2]))
-                    
-                    # Extract brand from name
-                    brand = self.extract_brand(item_name)
-                    
-                    # Create a random code
-                    code = self.generate_code(item_name)
-                    
-                    # Extract other properties
-                    color = self.extract_color(item_name)
-                    price = "20.00"  # Default price
-                    branch = "ojodu"  # Default branch
-                    branch_id = "3"   # Default branch ID
-                    description = f"{item_name}"
-                    
-                    # Add to items list
-                    self.items.append({
-                        "id": item_id,
-                        "name": item_name.lower(),
-                        "brand": brand,
-                        "color": color,
-                        "code": code,
-                        "quantity": quantity,
-                        "price": price,
-                        "branch": branch,
-                        "branch_id": branch_id,
-                        "description": description
-                    })
-                except Exception as e:
-                    print(f"Error processing row {idx + start_row}: {e}")
-                    continue
+            # Skip rows without a finite item number in the first column (text such as "inf"
+            # coerces to infinity) or with an empty item name, selecting the rows to keep
+            # with one mask before any per-field work
+            valid = np.isfinite(ids) & present.iloc[:, 1] & names.ne("")
+            data, ids, names, present = data[valid], ids[valid], names[valid], present[valid]
+            if names.empty:
+                return
+            
+            # Extract quantity if available (column index 2), defaulting to 1
+            if data.shape[1] > 2:
+                quantities = data.iloc[:, 2].astype(str)
+                quantities = quantities.where(present.iloc[:, 2] & quantities.str.isdigit(), "1")
+            else:
+                quantities = "1"
+            
+            # The same product name often appears on many rows, so brand, color and code
+            # prefix are worked out once per distinct name and then broadcast to the rows
+            name_index, unique_names = pd.factorize(names)
+            unique_names = pd.Series(unique_names)
+            
+            # Uppercase each name once and share it between the brand and color lookups
+            names_upper = unique_names.str.upper()
+            
+            brands = names_upper.map(self.extract_brand)
+            colors = names_upper.map(self.extract_color)
+            prefixes = self.code_prefixes(unique_names)
+            
+            brands, colors, prefixes = (
+                pd.Series(values.to_numpy()[name_index], index=names.index)
+                for values in (brands, colors, prefixes)
+            )
+            
+            # Derive every field column-wise, keeping the result as a frame for export;
+            # constant fields are given as scalars and broadcast by pandas
+            self.df = pd.DataFrame({
+                "id": ids.map(int).astype(str),  # Convert to int first to remove decimal points (Python int, so no int64 overflow)
+                "name": names.str.lower(),
+                "brand": brands,
+                "color": colors,
+                "code": self.generate_codes(prefixes),
+                "quantity": quantities,
+                "price": "20.00",  # Default price
+                "branch": self.branch,
+                "branch_id": self.branch_id,
+                "description": names,
+            })
                     
         except Exception as e:
             print(f"Error reading Excel file: {e}")
             raise
 
-    def extract_brand(self, name):
-        """Extract brand from item name"""
-        # Common brand keywords
-        brand_keywords = ["LINSAN", "BREVILLE", "PRIMA", "TESCO", "COLEMAN", "SAINSBURY'S", 
-                        "PYREX", "PHILIPS", "ELPINE", "OZARK", "SNAPWARE", "RUBBERMAID",
-                        "CORNINGWARE", "KIRKLAND", "HAIER", "INDESIT", "MIKASA", "LUMINARC"]
-        
+    def _find_keyword(self, keywords, name_upper):
+        """Return the earliest listed keyword found in an uppercased name, or None"""
+        for keyword in keywords:
+            if keyword in name_upper:
+                return keyword
+        return None
+
+    def extract_brand(self, name_upper):
+        """Extract brand from an uppercased item name"""
         # Check if any brand keyword is in the name
-        for brand in brand_keywords:
-            if brand in name.upper():
-                return brand.title()
+        brand = self._find_keyword(self.brand_keywords, name_upper)
+        if brand:
+            return brand.title()
         
         # If no brand found, return first word as brand
-        words = name.split()
+        words = name_upper.split()
         return words[0].title() if words else "Unknown"
 
-    def extract_color(self, name):
-        """Extract color from item name if present"""
-        colors = ["RED", "BLUE", "GREEN", "BLACK", "WHITE", "GREY", "PINK", "SILVER", "NAVY"]
-        for color in colors:
-            if color in name.upper():
-                return color.lower()
+    def extract_color(self, name_upper):
+        """Extract color from an uppercased item name if present"""
+        color = self._find_keyword(self.colors, name_upper)
+        if color:
+            return color.lower()
         return "silver"  # Default color
 
-    def generate_code(self, name):
-        """Generate a unique code for the item"""
-        # Use first 3 letters of name + random numbers
-        prefix = re.sub(r'[^a-zA-Z]', '', name)[:3].upper()
-        random_num = ''.join(random.choices(string.digits, k=9))
-        return f"{prefix}{random_num}"
+    def code_prefixes(self, names):
+        """Get the code prefix for each item name: its first 3 letters, uppercased"""
+        return names.str.replace(_NONALPHA_RE, '', regex=True).str.slice(0, 3).str.upper()
+
+    def generate_codes(self, prefixes):
+        """Generate a unique code for each item from its prefix"""
+        import numpy as np
+        import pandas as pd
+        
+        # Prefix + random numbers: the 9 random digits of every code come from a single
+        # os.urandom call (16-bit draws keep the modulo-10 bias negligible), turned into
+        # ASCII bytes and read back one row of 9 bytes at a time as a string
+        raw = np.frombuffer(os.urandom(2 * 9 * len(prefixes)), dtype=np.uint16).reshape(-1, 9)
+        digits = (raw % 10 + ord('0')).astype(np.uint8)
+        random_nums = digits.view('S9')[:, 0].astype(str)
+        return prefixes + pd.Series(random_nums, index=prefixes.index)
 
     def export_to_csv(self, filename="formatted_items.csv"):
         """Export items to CSV file"""
-        with open(filename, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=self.header)
-            writer.writeheader()
-            writer.writerows(self.items)
+        # A 1 MiB buffer turns the writer's many small writes into few large ones
+        with open(filename, 'w', newline='', buffering=1 << 20, encoding='utf-8') as csvfile:
+            self.df.to_csv(csvfile, columns=self.header, index=False, lineterminator="\r\n")
         return filename
 
     @classmethod
-    def format(cls, excel_path, sheet_name=0, output_filename="formatted_items.csv"):
+    def format(cls, excel_or_path, sheet_name=0, output_filename="formatted_items.csv", **kwargs):
         """Static method to create and process document in one step"""
-        formatter = cls(excel_path, sheet_name)
+        formatter = cls(excel_or_path, sheet_name, **kwargs)
         return formatter.export_to_csv(output_filename)
 
 
+def open_excel(excel_path):
+    """Open an Excel file, preferring the faster calamine engine when installed"""
+    import pandas as pd
+    
+    try:
+        return pd.ExcelFile(excel_path, engine="calamine")
+    except ImportError:
+        return pd.ExcelFile(excel_path)
+
+
+def _cached_read(excel_path, sheet_name=0):
+    """
+    Read a sheet, reusing a pickled copy from a previous run while the file is unchanged.
+    Entries are keyed by path, sheet and CACHE_VERSION, and stored in CACHE_DIR together with
+    the file's modification time; a changed file overwrites its entry rather than adding one.
+    """
+    import pandas as pd
+    
+    key = f"{os.path.abspath(excel_path)}:{sheet_name}:{CACHE_VERSION}"
+    cache_file = os.path.join(CACHE_DIR, hashlib.md5(key.encode()).hexdigest() + ".pkl")
+    mtime = os.path.getmtime(excel_path)
+    if os.path.isfile(cache_file):
+        try:
+            cached_mtime, df = pd.read_pickle(cache_file)
+            if cached_mtime == mtime:
+                return df
+        except Exception as e:
+            print(f"Ignoring unreadable cache file {cache_file}: {e}")
+    
+    with open_excel(excel_path) as xl:
+        df = xl.parse(sheet_name, **READ_OPTIONS)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        pd.to_pickle((mtime, df), cache_file)
+    except OSError as e:
+        print(f"Could not write cache file {cache_file}: {e}")
+    return df
+
+
+def read_sheet_names(excel_path):
+    """Read the sheet names of an Excel file without loading pandas or any cell data"""
+    try:
+        from python_calamine import CalamineWorkbook
+    except ImportError:
+        pass
+    else:
+        return CalamineWorkbook.from_path(excel_path).sheet_names
+    
+    if str(excel_path).lower().endswith(".xls"):
+        import xlrd
+        return xlrd.open_workbook(excel_path, on_demand=True).sheet_names()
+    
+    import openpyxl
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        return wb.sheetnames
+    finally:
+        wb.close()
+
+
 def list_sheets(excel_path):
     """List all sheet names in the Excel file"""
     try:
-        xl = pd.ExcelFile(excel_path)
+        sheet_names = read_sheet_names(excel_path)
         print(f"Available sheets in {excel_path}:")
-        for i, sheet in enumerate(xl.sheet_names):
+        for i, sheet in enumerate(sheet_names):
             print(f"  {i}: {sheet}")
-        return xl.sheet_names
+        return sheet_names
     except Exception as e:
         print(f"Error reading sheets: {e}")
         return []
@@ -186,9 +303,12 @@ Usage Examples:
   
   # Set branch information
   python format_document.py inventory.xlsx --branch ikeja --branch-id 5
+  
+  # Re-read the Excel file instead of reusing the copy cached by a previous run
+  python format_document.py inventory.xlsx --no-cache
 
 Required Dependencies:
-  pip install pandas openpyxl xlrd
+  pip install pandas openpyxl xlrd python-calamine
   
 For help on specific options:
   python format_document.py --help
@@ -221,6 +341,8 @@ Examples:
                       help='Branch ID to assign to items (default: 3)')
     parser.add_argument('--list-sheets', '-l', action='store_true',
                       help='List all sheets in the Excel file and exit')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Re-read the Excel file instead of reusing the sheet cached by a previous run')
     
     args = parser.parse_args()
     
@@ -255,18 +377,13 @@ Examples:
             pass
         
         # Format the document
-        formatter = FormatDocument(args.excel_path, sheet)
-        
-        # Update branch info if provided
-        if args.branch != 'ojodu' or args.branch_id != '3':
-            for item in formatter.items:
-                item['branch'] = args.branch
-                item['branch_id'] = args.branch_id
+        formatter = FormatDocument(args.excel_path, sheet, use_cache=not args.no_cache,
+                                   branch=args.branch, branch_id=args.branch_id)
         
         # Export to CSV
         csv_file = formatter.export_to_csv(args.output)
         print(f"Success! Formatted document saved to {csv_file}")
-        print(f"Processed {len(formatter.items)} items")
+        print(f"Processed {len(formatter.df)} items")
         
     except Exception as e:
         print(f"Error processing file: {e}")